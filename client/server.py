@@ -5,32 +5,88 @@ Browser Task Executor - Client Server
 Serves the test webpage for communicating with the extension.
 
 Usage:
-    python3 server.py [--port 8080]
+    python3 server.py [--port 8080] [--quiet]
 """
 
 import argparse
 import os
+import queue
+import sys
+import threading
 from http.server import HTTPServer, SimpleHTTPRequestHandler
 
+CLIENT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Request logs are handed to a background writer so request handling
+# never blocks on stdout. The queue is bounded: if stdout stalls, new
+# lines are dropped rather than buffered without limit, and the writer
+# reports how many were dropped once it catches up. The writer is a
+# daemon thread, so lines still queued at exit are lost.
+LOG_QUEUE_SIZE = 1000
+LOG_QUEUE = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+dropped_logs = 0
+dropped_logs_lock = threading.Lock()
+
+
+def drain_logs():
+    global dropped_logs
+    while True:
+        batch = [LOG_QUEUE.get()]
+        try:
+            while True:
+                batch.append(LOG_QUEUE.get_nowait())
+        except queue.Empty:
+            pass
+        with dropped_logs_lock:
+            dropped, dropped_logs = dropped_logs, 0
+        if dropped:
+            batch.append(f"[Server] {dropped} log lines dropped (stdout too slow)")
+        sys.stdout.write('\n'.join(batch) + '\n')
+        sys.stdout.flush()
+
 
 class Handler(SimpleHTTPRequestHandler):
+    # Send small responses immediately instead of waiting on Nagle's algorithm
+    disable_nagle_algorithm = True
+
+    quiet = False
+
     def __init__(self, *args, **kwargs):
-        super().__init__(*args, directory=os.path.dirname(os.path.abspath(__file__)), **kwargs)
+        super().__init__(*args, directory=CLIENT_DIR, **kwargs)
+
+    def copyfile(self, source, outputfile):
+        # Hand the file to the kernel (os.sendfile) instead of copying it
+        # through userspace; socket.sendfile falls back to send() if needed
+        if outputfile is self.wfile:
+            self.connection.sendfile(source)
+        else:
+            super().copyfile(source, outputfile)
 
     def end_headers(self):
         self.send_header('Access-Control-Allow-Origin', '*')
         super().end_headers()
 
     def log_message(self, format, *args):
-        print(f"[Server] {args[0]}")
+        global dropped_logs
+        if not self.quiet:
+            try:
+                LOG_QUEUE.put_nowait(f"[Server] {args[0]}")
+            except queue.Full:
+                with dropped_logs_lock:
+                    dropped_logs += 1
 
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--quiet', action='store_true', help='Disable request logging')
     args = parser.parse_args()
 
-    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    Handler.quiet = args.quiet
+    if not args.quiet:
+        threading.Thread(target=drain_logs, daemon=True).start()
+
+    os.chdir(CLIENT_DIR)
     server = HTTPServer(('127.0.0.1', args.port), Handler)
     print(f"Client server: http://127.0.0.1:{args.port}")
     server.serve_forever()
@@ -25,6 +25,9 @@ chrome.storage.local.get(['pollingEnabled', 'serverUrl', 'pollInterval']).then(s
   if (stored.pollInterval) settings.pollInterval = stored.pollInterval;
   // Keep this as console.log since it's startup info, not an operational log
   console.log('[BAT] Settings loaded, polling:', settings.pollingEnabled);
+  // Start polling only once stored settings are known, so a browser with
+  // polling disabled never picks up commands meant for another browser
+  restartPolling();
 });
 
 // ============ REQUEST HANDLER ============
@@ -58,13 +61,23 @@ async function handleToolRequest(message) {
 
 // ============ HTTP POLLING ============
 
+// Server holds GET /command open this long while no command is queued
+const LONG_POLL_MS = 25000;
+
+let pollTimeoutId = null;
+let pollAbort = null;
+let pollGeneration = 0;
+
+// Returns true if a command was received and executed
 async function pollForCommands() {
-  if (!settings.pollingEnabled) return;
+  if (!settings.pollingEnabled) return false;
 
+  pollAbort = new AbortController();
   try {
-    const response = await fetch(`${settings.serverUrl}/command`, {
+    const response = await fetch(`${settings.serverUrl}/command?wait=${LONG_POLL_MS}`, {
       method: 'GET',
-      headers: { 'Accept': 'application/json' }
+      headers: { 'Accept': 'application/json' },
+      signal: pollAbort.signal
     });
 
     if (response.status === 200) {
@@ -76,20 +89,30 @@ async function pollForCommands() {
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify(result)
       });
+      return true;
     }
   } catch (e) {
-    // Server not running - silent fail
+    // Server not running or poll aborted - silent fail
   }
+  return false;
 }
 
-// Start polling with dynamic interval
-let pollIntervalId = setInterval(pollForCommands, settings.pollInterval);
+// Poll again immediately after a command, otherwise wait pollInterval.
+// Servers without long-poll support answer 204 at once, so this
+// degrades to plain interval polling.
+async function pollLoop(generation) {
+  const handled = await pollForCommands();
+  if (generation !== pollGeneration || !settings.pollingEnabled) return; // restarted meanwhile
+  pollTimeoutId = setTimeout(pollLoop, handled ? 0 : settings.pollInterval, generation);
+}
 
 // Function to restart polling with new interval
 function restartPolling() {
-  clearInterval(pollIntervalId);
+  clearTimeout(pollTimeoutId);
+  pollAbort?.abort();
+  pollGeneration++;
   if (settings.pollingEnabled) {
-    pollIntervalId = setInterval(pollForCommands, settings.pollInterval);
+    pollTimeoutId = setTimeout(pollLoop, 0, pollGeneration);
     logger.debug(`Polling started with interval: ${settings.pollInterval}ms`);
   } else {
     logger.debug('Polling disabled');
@@ -7,6 +7,7 @@
  */
 
 import { createServer } from 'http';
+import { randomBytes } from 'crypto';
 import { readFileSync, writeFileSync, appendFileSync, existsSync, mkdirSync } from 'fs';
 import { dirname, join } from 'path';
 import { fileURLToPath } from 'url';
@@ -21,6 +22,7 @@ const __dirname = dirname(fileURLToPath(import.meta.url));
 const PORT = config.port;
 const HOST = config.host;
 const TIMEOUT_MS = config.commandTimeout;
+const LONG_POLL_MS = config.longPollTimeout;
 const MAX_LOGS_IN_MEMORY = config.maxLogsInMemory;
 const LOGS_FILE = join(__dirname, 'data', 'logs.jsonl');
 
@@ -28,9 +30,9 @@ const LOGS_FILE = join(__dirname, 'data', 'logs.jsonl');
 let useDatabase = false;
 
 // State
-let pendingCommand = null;
-let pendingResult = null;
-let resultResolve = null;
+const commandQueue = [];      // Commands waiting for the extension to poll
+const inflight = new Map();   // commandId -> resolve(result)
+const commandWaiters = [];    // Long-polling GET /command responses waiting for a command
 const startTime = Date.now();
 
 // SubtaskId to browser/tab mapping for future multi-browser routing
@@ -39,6 +41,76 @@ const subtaskBrowserMap = new Map();
 // Logs storage
 const logs = [];
 
+// Read a request body as a single UTF-8 string. Chunks are joined as bytes
+// first so multi-byte characters split across chunks decode correctly.
+function readBody(req) {
+  return new Promise((resolve, reject) => {
+    const chunks = [];
+    req.on('data', chunk => chunks.push(chunk));
+    req.on('end', () => resolve(Buffer.concat(chunks).toString('utf8')));
+    req.on('error', reject);
+  });
+}
+
+// Write a JSON response (object or pre-encoded string) as a single write
+function sendJson(res, status, payload) {
+  const body = typeof payload === 'string' ? payload : JSON.stringify(payload);
+  res.writeHead(status, {
+    'Content-Type': 'application/json',
+    'Content-Length': Buffer.byteLength(body)
+  });
+  res.end(body);
+}
+
+// Cheap first-byte check so bodies that cannot be a JSON object are
+// rejected without going through JSON.parse and a thrown SyntaxError.
+// Every POST endpoint expects an object.
+function looksLikeJsonObject(body) {
+  return /^\s*\{/.test(body);
+}
+
+// Hand a command to a long-polling extension if one is waiting, otherwise queue it
+function enqueueCommand(command) {
+  while (commandWaiters.length > 0) {
+    const waiter = commandWaiters.shift();
+    clearTimeout(waiter.timer);
+    if (!waiter.res.destroyed) {
+      sendJson(waiter.res, 200, command);
+      return;
+    }
+  }
+  commandQueue.push(command);
+}
+
+// Queue a command for the extension and wait for its result (or timeout).
+// Results are matched back by command id, so several commands can be in flight at once.
+// If the caller disconnects first, the command is withdrawn so the extension
+// does not run work nobody is waiting for.
+function dispatchCommand(command, timeoutMessage, res) {
+  return new Promise(resolve => {
+    const settle = (result) => {
+      clearTimeout(timer);
+      res.off('close', onClose);
+      inflight.delete(command.id);
+      const idx = commandQueue.indexOf(command);
+      if (idx !== -1) {
+        commandQueue.splice(idx, 1);
+      }
+      resolve(result);
+    };
+    const onClose = () => {
+      if (!res.writableFinished) {
+        settle({ error: 'cancelled', message: 'Client disconnected' });
+      }
+    };
+    const timer = setTimeout(() => settle({ error: 'timeout', message: timeoutMessage }), TIMEOUT_MS);
+
+    res.on('close', onClose);
+    inflight.set(command.id, settle);
+    enqueueCommand(command);
+  });
+}
+
 // Initialize logs - try database first, fallback to file
 async function initLogs() {
   // Try database connection
@@ -1302,6 +1374,14 @@ function getToolsHTML() {
 </html>`;
 }
 
+// Static responses, rendered once at startup (TOOLS never changes at runtime)
+const LOGS_HTML = getLogsHTML();
+const TOOLS_HTML = getToolsHTML();
+const TOOLS_JSON = JSON.stringify({ tools: TOOLS, count: Object.keys(TOOLS).length });
+const GET_TOOLS_JSON = JSON.stringify({ success: true, result: { tools: TOOLS, count: Object.keys(TOOLS).length } });
+const NOT_FOUND_JSON = JSON.stringify({ error: 'Not found' });
+const INVALID_JSON = JSON.stringify({ error: 'Invalid JSON', message: 'Request body must be a JSON object' });
+
 async function handleRequest(req, res) {
   // CORS headers
   res.setHeader('Access-Control-Allow-Origin', '*');
@@ -1326,14 +1406,14 @@ async function handleRequest(req, res) {
   // Logs viewer - HTML page
   if (req.method === 'GET' && url.pathname === '/logs') {
     res.writeHead(200, { 'Content-Type': 'text/html' });
-    res.end(getLogsHTML());
+    res.end(LOGS_HTML);
     return;
   }
 
   // Tools reference - HTML page
   if (req.method === 'GET' && url.pathname === '/tools') {
     res.writeHead(200, { 'Content-Type': 'text/html' });
-    res.end(getToolsHTML());
+    res.end(TOOLS_HTML);
     return;
   }
 
@@ -1351,8 +1431,7 @@ async function handleRequest(req, res) {
       }
     }
 
-    res.writeHead(200, { 'Content-Type': 'application/json' });
-    res.end(JSON.stringify({
+    sendJson(res, 200, {
       status: 'ok',
       name: 'browser-automation-toolkit',
       version: VERSION,
@@ -1364,14 +1443,13 @@ async function handleRequest(req, res) {
         connected: db.isConnected(),
         configured: !!config.databaseUrl
       }
-    }));
+    });
     return;
   }
 
   // API: List tools (JSON)
   if (req.method === 'GET' && url.pathname === '/api/tools') {
-    res.writeHead(200, { 'Content-Type': 'application/json' });
-    res.end(JSON.stringify({ tools: TOOLS, count: Object.keys(TOOLS).length }));
+    sendJson(res, 200, TOOLS_JSON);
     return;
   }
 
@@ -1419,17 +1497,15 @@ async function handleRequest(req, res) {
         filters = await getLogFilters();
       }
 
-      res.writeHead(200, { 'Content-Type': 'application/json' });
-      res.end(JSON.stringify({
+      sendJson(res, 200, {
         logs: result,
         count: result.length,
         total,
         levels: filters.levels,
         tools: filters.tools
-      }));
+      });
     } catch (e) {
-      res.writeHead(500, { 'Content-Type': 'application/json' });
-      res.end(JSON.stringify({ error: e.message }));
+      sendJson(res, 500, { error: e.message });
     }
     return;
   }
@@ -1438,235 +1514,243 @@ async function handleRequest(req, res) {
   if (req.method === 'DELETE' && url.pathname === '/api/logs') {
     try {
       await clearLogs();
-      res.writeHead(200, { 'Content-Type': 'application/json' });
-      res.end(JSON.stringify({ success: true, message: 'Logs cleared' }));
+      sendJson(res, 200, { success: true, message: 'Logs cleared' });
     } catch (e) {
-      res.writeHead(500, { 'Content-Type': 'application/json' });
-      res.end(JSON.stringify({ error: e.message }));
+      sendJson(res, 500, { error: e.message });
     }
     return;
   }
 
   // API: Receive log from extension
   if (req.method === 'POST' && url.pathname === '/log') {
-    let body = '';
-    req.on('data', chunk => body += chunk);
-    req.on('end', async () => {
-      try {
-        const entry = JSON.parse(body);
-        const log = await addLog(entry);
-        res.writeHead(200, { 'Content-Type': 'application/json' });
-        res.end(JSON.stringify({ success: true, id: log.id }));
-      } catch (e) {
-        res.writeHead(400, { 'Content-Type': 'application/json' });
-        res.end(JSON.stringify({ error: 'Invalid JSON' }));
+    try {
+      const body = await readBody(req);
+      if (!looksLikeJsonObject(body)) {
+        sendJson(res, 400, { error: 'Invalid JSON' });
+        return;
       }
-    });
+      const entry = JSON.parse(body);
+      const log = await addLog(entry);
+      sendJson(res, 200, { success: true, id: log.id });
+    } catch (e) {
+      sendJson(res, 400, { error: 'Invalid JSON' });
+    }
     return;
   }
 
-  // Extension polls for commands
+  // Extension polls for commands. With ?wait=ms the request is held open
+  // until a command arrives or the wait expires (long-poll).
   if (req.method === 'GET' && url.pathname === '/command') {
-    if (pendingCommand) {
-      const cmd = pendingCommand;
-      pendingCommand = null;
-      res.writeHead(200, { 'Content-Type': 'application/json' });
-      res.end(JSON.stringify(cmd));
-    } else {
+    if (commandQueue.length > 0) {
+      const cmd = commandQueue.shift();
+      sendJson(res, 200, cmd);
+      return;
+    }
+
+    const wait = Math.min(parseInt(url.searchParams.get('wait')) || 0, LONG_POLL_MS);
+    if (wait <= 0) {
       res.writeHead(204);
       res.end();
+      return;
     }
+
+    const waiter = { res, timer: null };
+    const removeWaiter = () => {
+      clearTimeout(waiter.timer);
+      const idx = commandWaiters.indexOf(waiter);
+      if (idx !== -1) {
+        commandWaiters.splice(idx, 1);
+      }
+    };
+    waiter.timer = setTimeout(() => {
+      removeWaiter();
+      res.writeHead(204);
+      res.end();
+    }, wait);
+    // Extension aborted the poll (reload, settings change)
+    res.on('close', removeWaiter);
+    commandWaiters.push(waiter);
     return;
   }
 
   // External tool sends command
   if (req.method === 'POST' && url.pathname === '/command') {
-    let body = '';
-    req.on('data', chunk => body += chunk);
-    req.on('end', async () => {
-      try {
-        const command = JSON.parse(body);
-
-        // Validate tool
-        if (!command.tool) {
-          res.writeHead(400, { 'Content-Type': 'application/json' });
-          res.end(JSON.stringify({ error: 'Missing tool parameter' }));
-          return;
-        }
-
-        // Handle server-side tools
-        if (command.tool === 'ping') {
-          res.writeHead(200, { 'Content-Type': 'application/json' });
-          res.end(JSON.stringify({ success: true, result: { pong: true, timestamp: Date.now() } }));
-          return;
-        }
+    try {
+      const body = await readBody(req);
+      if (!looksLikeJsonObject(body)) {
+        sendJson(res, 400, INVALID_JSON);
+        return;
+      }
+      const command = JSON.parse(body);
 
-        if (command.tool === 'get_tools') {
-          res.writeHead(200, { 'Content-Type': 'application/json' });
-          res.end(JSON.stringify({ success: true, result: { tools: TOOLS, count: Object.keys(TOOLS).length } }));
-          return;
-        }
+      // Validate tool
+      if (!command.tool) {
+        sendJson(res, 400, { error: 'Missing tool parameter' });
+        return;
+      }
 
-        // Queue command for extension
-        const commandId = command.id || `cmd_${Date.now()}`;
-        pendingCommand = {
-          id: commandId,
-          tool: command.tool,
-          args: command.args || {},
-          tabId: command.tabId,
-          subtaskId: command.subtaskId || null
-        };
+      // Handle server-side tools
+      if (command.tool === 'ping') {
+        sendJson(res, 200, { success: true, result: { pong: true, timestamp: Date.now() } });
+        return;
+      }
 
-        // Store subtaskId -> tabId mapping for future multi-browser routing
-        if (command.subtaskId && command.tabId) {
-          subtaskBrowserMap.set(command.subtaskId, command.tabId);
-        }
+      if (command.tool === 'get_tools') {
+        sendJson(res, 200, GET_TOOLS_JSON);
+        return;
+      }
 
-        // Wait for result with timeout
-        const resultPromise = new Promise(resolve => {
-          resultResolve = resolve;
-        });
+      // Queue command for extension. Generated ids must be unique because
+      // results are matched back to callers by id.
+      const commandId = command.id || `cmd_${randomBytes(8).toString('hex')}`;
+      if (inflight.has(commandId)) {
+        sendJson(res, 409, { error: 'Duplicate command id', message: `Command ${commandId} is already in flight` });
+        return;
+      }
+      const queued = {
+        id: commandId,
+        tool: command.tool,
+        args: command.args || {},
+        tabId: command.tabId,
+        subtaskId: command.subtaskId || null
+      };
 
-        const timeoutPromise = new Promise(resolve => {
-          setTimeout(() => resolve({ error: 'timeout', message: `Command timed out after ${TIMEOUT_MS}ms` }), TIMEOUT_MS);
-        });
+      // Store subtaskId -> tabId mapping for future multi-browser routing
+      if (command.subtaskId && command.tabId) {
+        subtaskBrowserMap.set(command.subtaskId, command.tabId);
+      }
 
-        const result = await Promise.race([resultPromise, timeoutPromise]);
-        resultResolve = null;
+      // Wait for result with timeout
+      const result = await dispatchCommand(queued, `Command timed out after ${TIMEOUT_MS}ms`, res);
 
-        res.writeHead(200, { 'Content-Type': 'application/json' });
-        res.end(JSON.stringify(result));
-      } catch (e) {
-        res.writeHead(400, { 'Content-Type': 'application/json' });
-        res.end(JSON.stringify({ error: 'Invalid JSON', message: e.message }));
-      }
-    });
+      sendJson(res, 200, result);
+    } catch (e) {
+      sendJson(res, 400, { error: 'Invalid JSON', message: e.message });
+    }
     return;
   }
 
   // Batch commands endpoint - execute multiple commands sequentially
   if (req.method === 'POST' && url.pathname === '/commands') {
-    let body = '';
-    req.on('data', chunk => body += chunk);
-    req.on('end', async () => {
-      try {
-        const batch = JSON.parse(body);
-        const { commands, subtaskId } = batch;
+    try {
+      const body = await readBody(req);
+      if (!looksLikeJsonObject(body)) {
+        sendJson(res, 400, INVALID_JSON);
+        return;
+      }
+      const batch = JSON.parse(body);
+      const { commands, subtaskId } = batch;
 
-        if (!Array.isArray(commands) || commands.length === 0) {
-          res.writeHead(400, { 'Content-Type': 'application/json' });
-          res.end(JSON.stringify({ error: 'Commands must be a non-empty array' }));
-          return;
-        }
+      if (!Array.isArray(commands) || commands.length === 0) {
+        sendJson(res, 400, { error: 'Commands must be a non-empty array' });
+        return;
+      }
 
-        const results = [];
-        let lastRef = null;
-        let hasError = false;
-
-        for (let i = 0; i < commands.length; i++) {
-          const cmd = commands[i];
-
-          if (!cmd.tool) {
-            results.push({
-              success: false,
-              index: i,
-              error: 'Missing tool parameter'
-            });
-            hasError = true;
-            break;
-          }
-
-          // Resolve $prev reference
-          const args = { ...cmd.args };
-          if (args.ref === '$prev' && lastRef) {
-            args.ref = lastRef;
-          }
-
-          // Queue command for extension
-          const commandId = cmd.id || `batch_${Date.now()}_${i}`;
-          pendingCommand = {
-            id: commandId,
-            tool: cmd.tool,
-            args,
-            tabId: cmd.tabId,
-            subtaskId: subtaskId || null
-          };
-
-          // Wait for result
-          const resultPromise = new Promise(resolve => {
-            resultResolve = resolve;
-          });
+      const results = [];
+      let lastRef = null;
+      let hasError = false;
+      const batchId = randomBytes(8).toString('hex');
 
-          const timeoutPromise = new Promise(resolve => {
-            setTimeout(() => {
-              pendingCommand = null;
-              resolve({ error: 'timeout', message: `Command ${i} timed out after ${TIMEOUT_MS}ms` });
-            }, TIMEOUT_MS);
-          });
+      for (let i = 0; i < commands.length; i++) {
+        const cmd = commands[i];
 
-          const result = await Promise.race([resultPromise, timeoutPromise]);
-          resultResolve = null;
+        if (!cmd.tool) {
+          results.push({
+            success: false,
+            index: i,
+            error: 'Missing tool parameter'
+          });
+          hasError = true;
+          break;
+        }
 
-          // Track ref for next command
-          if (result.success !== false && !result.error && result.result?.ref) {
-            lastRef = result.result.ref;
-          }
+        // Resolve $prev reference
+        const args = { ...cmd.args };
+        if (args.ref === '$prev' && lastRef) {
+          args.ref = lastRef;
+        }
 
+        // Queue command for extension
+        const commandId = cmd.id || `batch_${batchId}_${i}`;
+        if (inflight.has(commandId)) {
           results.push({
-            success: result.success !== false && !result.error,
+            success: false,
             index: i,
-            tool: cmd.tool,
-            description: cmd.description || '',
-            result: result.result || null,
-            error: result.error || null
+            error: `Command ${commandId} is already in flight`
           });
+          hasError = true;
+          break;
+        }
+        const queued = {
+          id: commandId,
+          tool: cmd.tool,
+          args,
+          tabId: cmd.tabId,
+          subtaskId: subtaskId || null
+        };
 
-          // Stop on error
-          if (result.error || result.success === false) {
-            hasError = true;
-            break;
-          }
+        // Wait for result
+        const result = await dispatchCommand(queued, `Command ${i} timed out after ${TIMEOUT_MS}ms`, res);
+
+        // Track ref for next command
+        if (result.success !== false && !result.error && result.result?.ref) {
+          lastRef = result.result.ref;
         }
 
-        res.writeHead(200, { 'Content-Type': 'application/json' });
-        res.end(JSON.stringify({
-          success: !hasError,
-          subtaskId: subtaskId || null,
-          commandsExecuted: results.length,
-          commandsTotal: commands.length,
-          results
-        }));
-      } catch (e) {
-        res.writeHead(400, { 'Content-Type': 'application/json' });
-        res.end(JSON.stringify({ error: 'Invalid JSON', message: e.message }));
+        results.push({
+          success: result.success !== false && !result.error,
+          index: i,
+          tool: cmd.tool,
+          description: cmd.description || '',
+          result: result.result || null,
+          error: result.error || null
+        });
+
+        // Stop on error
+        if (result.error || result.success === false) {
+          hasError = true;
+          break;
+        }
       }
-    });
+
+      sendJson(res, 200, {
+        success: !hasError,
+        subtaskId: subtaskId || null,
+        commandsExecuted: results.length,
+        commandsTotal: commands.length,
+        results
+      });
+    } catch (e) {
+      sendJson(res, 400, { error: 'Invalid JSON', message: e.message });
+    }
     return;
   }
 
   // Extension posts result
   if (req.method === 'POST' && url.pathname === '/result') {
-    let body = '';
-    req.on('data', chunk => body += chunk);
-    req.on('end', () => {
-      try {
-        const result = JSON.parse(body);
-        if (resultResolve) {
-          resultResolve(result);
-        }
-        res.writeHead(200);
-        res.end();
-      } catch (e) {
+    try {
+      const body = await readBody(req);
+      if (!looksLikeJsonObject(body)) {
         res.writeHead(400);
         res.end();
+        return;
       }
-    });
+      const result = JSON.parse(body);
+      const resolve = inflight.get(result.id);
+      if (resolve) {
+        resolve(result);
+      }
+      res.writeHead(200);
+      res.end();
+    } catch (e) {
+      res.writeHead(400);
+      res.end();
+    }
     return;
   }
 
   // 404
-  res.writeHead(404, { 'Content-Type': 'application/json' });
-  res.end(JSON.stringify({ error: 'Not found' }));
+  sendJson(res, 404, NOT_FOUND_JSON);
 }
 
 const server = createServer(handleRequest);
@@ -10,6 +10,8 @@ export const config = {
 
   // Command execution
   commandTimeout: parseInt(process.env.COMMAND_TIMEOUT) || 30000,
+  // Upper bound for GET /command?wait=ms long-polls
+  longPollTimeout: parseInt(process.env.LONG_POLL_TIMEOUT) || 25000,
 
   // Database settings
   databaseUrl: process.env.DATABASE_URL || null,
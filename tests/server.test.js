@@ -10,6 +10,10 @@ import { createServer } from 'http';
 const PORT = 8767; // Use different port for tests
 const BASE_URL = `http://127.0.0.1:${PORT}`;
 
+// Short long-poll cap so the real server's wait limit can be tested quickly
+// (read by src/config.js when server.js is first imported)
+process.env.LONG_POLL_TIMEOUT = '500';
+
 // Test server implementation (mirrors server.js behavior)
 let server;
 let pendingCommand = null;
@@ -776,6 +780,160 @@ describe('CORS Support', () => {
   });
 });
 
+// ============ COMMAND DISPATCH (real server.js) ============
+
+describe('Command Dispatch (server.js)', () => {
+  const testUrl = `http://127.0.0.1:${PORT + 5}`;
+  let realServer;
+
+  const postCommand = (body, options = {}) => fetch(`${testUrl}/command`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(body),
+    ...options
+  });
+
+  const postResult = (body) => fetch(`${testUrl}/result`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(body)
+  });
+
+  const delay = (ms) => new Promise(r => setTimeout(r, ms));
+
+  before(async () => {
+    ({ server: realServer } = await import('../server.js'));
+    await new Promise(resolve => realServer.listen(PORT + 5, '127.0.0.1', resolve));
+  });
+
+  after(() => {
+    realServer.closeAllConnections();
+    realServer.close();
+  });
+
+  test('Concurrent commands are queued and resolved by id', async () => {
+    const first = postCommand({ id: 'real_first', tool: 'get_url' });
+    const second = postCommand({ id: 'real_second', tool: 'get_url' });
+    await delay(50);
+
+    const cmdA = await (await fetch(`${testUrl}/command`)).json();
+    const cmdB = await (await fetch(`${testUrl}/command`)).json();
+    assert.deepStrictEqual([cmdA.id, cmdB.id].sort(), ['real_first', 'real_second']);
+
+    // Answer in reverse order
+    await postResult({ id: cmdB.id, success: true, result: { from: cmdB.id } });
+    await postResult({ id: cmdA.id, success: true, result: { from: cmdA.id } });
+
+    assert.strictEqual((await (await first).json()).result.from, 'real_first');
+    assert.strictEqual((await (await second).json()).result.from, 'real_second');
+  });
+
+  test('Generated command ids are unique', async () => {
+    const pending = [1, 2, 3].map(() => postCommand({ tool: 'get_url' }));
+    await delay(50);
+
+    const ids = [];
+    for (let i = 0; i < 3; i++) {
+      ids.push((await (await fetch(`${testUrl}/command`)).json()).id);
+    }
+    assert.strictEqual(new Set(ids).size, 3);
+
+    for (const id of ids) {
+      await postResult({ id, success: true, result: {} });
+    }
+    await Promise.all(pending);
+  });
+
+  test('Long-poll wakes when a command is posted', async () => {
+    const pollPromise = fetch(`${testUrl}/command?wait=5000`);
+    await delay(50);
+
+    const start = Date.now();
+    const commandPromise = postCommand({ id: 'real_long_poll', tool: 'get_url' });
+    const pollRes = await pollPromise;
+    assert.strictEqual(pollRes.status, 200);
+    assert.ok(Date.now() - start < 1000);
+    assert.strictEqual((await pollRes.json()).id, 'real_long_poll');
+
+    await postResult({ id: 'real_long_poll', success: true, result: {} });
+    await commandPromise;
+  });
+
+  test('Long-poll returns 204 after the wait expires', async () => {
+    const start = Date.now();
+    const res = await fetch(`${testUrl}/command?wait=200`);
+    const elapsed = Date.now() - start;
+
+    assert.strictEqual(res.status, 204);
+    assert.ok(elapsed >= 150, `Expected ~200ms long-poll, got ${elapsed}ms`);
+  });
+
+  test('Long-poll wait is capped by LONG_POLL_TIMEOUT', async () => {
+    const start = Date.now();
+    const res = await fetch(`${testUrl}/command?wait=99999`);
+    const elapsed = Date.now() - start;
+
+    assert.strictEqual(res.status, 204);
+    assert.ok(elapsed >= 400 && elapsed < 2000, `Expected ~500ms cap, got ${elapsed}ms`);
+  });
+
+  test('Aborted long-poll does not swallow the next command', async () => {
+    const controller = new AbortController();
+    const pollPromise = fetch(`${testUrl}/command?wait=5000`, { signal: controller.signal }).catch(() => null);
+    await delay(50);
+    controller.abort();
+    await pollPromise;
+    await delay(50);
+
+    const commandPromise = postCommand({ id: 'real_after_abort', tool: 'get_url' });
+    await delay(50);
+
+    const pollRes = await fetch(`${testUrl}/command`);
+    assert.strictEqual(pollRes.status, 200);
+    assert.strictEqual((await pollRes.json()).id, 'real_after_abort');
+
+    await postResult({ id: 'real_after_abort', success: true, result: {} });
+    await commandPromise;
+  });
+
+  test('Duplicate in-flight id is rejected for single and batch commands', async () => {
+    const first = postCommand({ id: 'real_dup', tool: 'get_url' });
+    await delay(50);
+
+    const single = await postCommand({ id: 'real_dup', tool: 'get_url' });
+    assert.strictEqual(single.status, 409);
+
+    const batch = await fetch(`${testUrl}/commands`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ commands: [{ id: 'real_dup', tool: 'get_url' }] })
+    });
+    const batchData = await batch.json();
+    assert.strictEqual(batchData.success, false);
+    assert.ok(batchData.results[0].error.includes('already in flight'));
+
+    // Only the original command was queued
+    const cmd = await (await fetch(`${testUrl}/command`)).json();
+    assert.strictEqual(cmd.id, 'real_dup');
+    assert.strictEqual((await fetch(`${testUrl}/command`)).status, 204);
+
+    await postResult({ id: 'real_dup', success: true, result: {} });
+    await first;
+  });
+
+  test('Command is withdrawn when the caller disconnects while waiting', async () => {
+    const controller = new AbortController();
+    const commandPromise = postCommand({ id: 'real_abandoned', tool: 'get_url' }, { signal: controller.signal })
+      .catch(() => null);
+    await delay(50);
+    controller.abort();
+    await commandPromise;
+    await delay(50);
+
+    assert.strictEqual((await fetch(`${testUrl}/command`)).status, 204);
+  });
+});
+
 // ============ BATCH COMMANDS TESTS ============
 
 describe('Batch Commands Endpoint', () => {